@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 import os
 import re
+import mmap
+import shutil
+import signal
 import sys
-import time
+import threading
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
-from typing import Tuple, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Tuple, Optional, Set, Union
 from datetime import datetime, timedelta
 
 # Configure logging to stdout
@@ -32,6 +40,8 @@ INTERVAL_SECONDS = int(os.environ.get("INTERVAL_SECONDS", "0"))
 MAX_ITEMS_PER_RUN = int(os.environ.get("MAX_ITEMS_PER_RUN", "0"))
 # Cache duration for M3U file in hours (default: 8 hours)
 M3U_CACHE_HOURS = int(os.environ.get("M3U_CACHE_HOURS", "8"))
+# Number of concurrent Emby API requests (default: 16, at least 1)
+EMBY_MAX_WORKERS = max(1, int(os.environ.get("EMBY_MAX_WORKERS", "16")))
 
 # Path mapping for Emby (container path -> host path)
 # If not set, assumes container paths match host paths
@@ -45,11 +55,87 @@ INCLUDE_COUNTRY_CODES = set(code.strip().upper() for code in os.environ.get("INC
 
 # Temporary M3U file
 TMP_PLAYLIST = Path("/tmp/playlist.m3u")
+# Script state kept between runs, outside the library directories Emby scans
+STATE_DIR = Path("/usr/src/app/.state")
+# Index of STRM files per library directory (STATE_DIR/<dir name>.strm_index) for orphan detection
+STRM_INDEX_NAME = ".strm_index"
+# Runs an index is trusted for before a full directory scan validates it again, so STRM
+# files the index never recorded (e.g. copied in by hand) are still found as orphans
+STRM_INDEX_MAX_RUNS = 24
 
-def download_playlist():
+# Characters stripped from filenames by safe_filename (str.translate deletion table)
+_UNSAFE_CHARS_TABLE = str.maketrans('', '', '\\/:"*?<>|#')
+
+# Precompiled regular expressions (used once per playlist entry)
+_RE_YEAR = re.compile(r'\((\d{4})\)')
+_RE_LOWERCASE = re.compile(r'[a-z]')
+_RE_ACTOR_SUFFIX = re.compile(r'\s+[A-Z]{2,}(?:\s+[A-Z]{2,})*,?\s*$')
+_RE_PARENS = re.compile(r'\s*\([^()]*\)')
+# Fused title cleanup: language prefix ("EN - ", "D+ - ", "SHWT - ") together with
+# parenthesised content (movies) or the season/episode tail (series)
+_LANG_PREFIX = r'^[A-Z0-9+]{1,4}\s*-\s*'
+_SEASON_EPISODE_SUFFIX = r'(?i:[\s\-\.]+S\d{1,2}\s*E\d{1,2}.*$)'
+_RE_MOVIE_NOISE = re.compile(f'{_LANG_PREFIX}|{_RE_PARENS.pattern}')
+_RE_SERIES_NOISE = re.compile(f'{_LANG_PREFIX}|{_SEASON_EPISODE_SUFFIX}')
+_RE_SEASON_EPISODE = re.compile(r'S(\d{1,2})\s*E(\d{1,2})', re.IGNORECASE)
+# Zero-padded "00".."99" for season/episode numbers (the regex above caps them at two digits)
+_TWO_DIGITS = tuple(f"{i:02d}" for i in range(100))
+_RE_CONTENT_ID = re.compile(r'/(\d+)\.(mp4|mkv|avi|mov|m4v)$', re.IGNORECASE)
+_RE_COUNTRY_CODE = re.compile(r'^([A-Z]{2})\|')
+# One playlist entry: the #EXTINF line (with its tvg-name and group-title, when present)
+# followed by the next line, which holds the stream URL. Bytes pattern so it can run
+# directly on the memory-mapped playlist; accepts \n, \r\n and \r line endings.
+# The URL's category token (/movie/ or /series/, any case) is captured in the same scan
+_RE_PLAYLIST_ENTRY = re.compile(
+    rb'(?:^|(?<=\r))(#EXTINF'
+    rb'(?:(?=[^\r\n]*?tvg-name="([^"\r\n]+)")|)'
+    rb'(?:(?=[^\r\n]*?group-title="([^"\r\n]+)")|)'
+    rb'[^\r\n]*)(?:\r\n|\r|\n)?'
+    rb'(?:(?=[^\r\n]*?(?i:(/movie/)))|)'
+    rb'(?:(?=[^\r\n]*?(?i:(/series/)))|)'
+    rb'([^\r\n]*)',
+    re.MULTILINE
+)
+
+def _create_session() -> requests.Session:
+    """
+    Create the shared HTTP session used for the playlist download and all Emby calls.
+    Connections are kept alive and pooled so repeated Emby requests skip the TCP/TLS handshake.
+    The pool holds one connection per Emby worker, so concurrent requests never discard one.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=EMBY_MAX_WORKERS,
+        # Only idempotent requests are retried once sent; the POST refresh calls are not
+        max_retries=Retry(total=3, backoff_factor=0.2, allowed_methods=frozenset({"GET", "HEAD", "DELETE"}))
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_SESSION = _create_session()
+
+# URLs of STRM files seen so far, keyed by path string and validated against (mtime_ns, size)
+# so repeated runs in the INTERVAL_SECONDS loop don't re-read unchanged files
+_URL_CACHE: Dict[str, Tuple[int, int, str]] = {}
+# Directories already created by write_strm_file (skips repeated mkdir for every episode)
+_MKDIR_CACHE: Set[str] = set()
+# ETag / Last-Modified of the last downloaded playlist, for conditional re-downloads
+_PLAYLIST_VALIDATORS: Dict[str, str] = {}
+# Emby item IDs found by path (Emby path -> item ID); only hits are cached so
+# files Emby hasn't scanned yet are looked up again
+_EMBY_ITEM_IDS: Dict[str, str] = {}
+# Set by SIGTERM/SIGINT to end the interval loop without waiting out the sleep
+_STOP = threading.Event()
+
+def download_playlist() -> bool:
     """
     Download M3U playlist from remote source.
     Only downloads if file doesn't exist, is empty, or is older than M3U_CACHE_HOURS.
+    An expired cache is revalidated with a conditional GET (If-None-Match/If-Modified-Since).
+    Returns True only when new playlist content was written; a fresh cache hit or an
+    unchanged playlist (304) returns False.
     """
     # Check if we need to download
     should_download = False
@@ -75,51 +161,84 @@ def download_playlist():
     
     if should_download:
         logger.info(f"⬇️ Downloading playlist from {M3U_URL} ({reason})")
-        resp = requests.get(M3U_URL)
-        resp.raise_for_status()
-        TMP_PLAYLIST.write_text(resp.text, encoding="utf-8")
+        # Only revalidate when there is a cached file to fall back on
+        headers = {}
+        if TMP_PLAYLIST.exists() and TMP_PLAYLIST.stat().st_size > 0:
+            if "ETag" in _PLAYLIST_VALIDATORS:
+                headers["If-None-Match"] = _PLAYLIST_VALIDATORS["ETag"]
+            if "Last-Modified" in _PLAYLIST_VALIDATORS:
+                headers["If-Modified-Since"] = _PLAYLIST_VALIDATORS["Last-Modified"]
+        # Stream the response to disk in chunks rather than holding the whole
+        # playlist (and its decoded copy) in memory. Write to a temporary file and
+        # swap it in only once complete, so an interrupted download never leaves a
+        # truncated playlist that would be treated as a fresh cache
+        partial_playlist = TMP_PLAYLIST.with_name(TMP_PLAYLIST.name + ".part")
+        try:
+            with _SESSION.get(M3U_URL, headers=headers, stream=True, timeout=30) as resp:
+                resp.raise_for_status()
+                if resp.status_code == 304:
+                    # Unchanged on the server - renew the cache age and keep the file
+                    os.utime(TMP_PLAYLIST)
+                    logger.info("ℹ️ Playlist not modified since last download")
+                    return False
+                with open(partial_playlist, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=1 << 20):
+                        f.write(chunk)
+                _PLAYLIST_VALIDATORS.clear()
+                for header in ("ETag", "Last-Modified"):
+                    if header in resp.headers:
+                        _PLAYLIST_VALIDATORS[header] = resp.headers[header]
+            os.replace(partial_playlist, TMP_PLAYLIST)
+        finally:
+            partial_playlist.unlink(missing_ok=True)
         logger.info(f"✅ Saved to {TMP_PLAYLIST}")
-    else:
-        logger.debug(f"Using existing playlist file: {TMP_PLAYLIST}")
+        return True
+    logger.debug(f"Using existing playlist file: {TMP_PLAYLIST}")
+    return False
+
+# Name parsing is pure, so results are memoized: titles repeat within a
+# playlist and every entry repeats on the next interval run
+_NAME_CACHE_SIZE = 200_000
 
+@lru_cache(maxsize=_NAME_CACHE_SIZE)
 def safe_filename(name: str) -> str:
     # Remove invalid filesystem characters including # which can cause issues
-    return re.sub(r'[\\/:"*?<>|#]+', '', name).strip()
+    return name.translate(_UNSAFE_CHARS_TABLE).strip()
 
+@lru_cache(maxsize=_NAME_CACHE_SIZE)
 def parse_movie_name(tvg_name: str):
-    # Remove language prefix like "EN - ", "NF - ", "D+ - ", etc.
-    tvg_name = re.sub(r'^[A-Z0-9+]{1,4}\s*-\s*', '', tvg_name).strip()
     # Extract year (can be anywhere, but typically after title)
-    year_match = re.search(r'\((\d{4})\)', tvg_name)
+    year_match = _RE_YEAR.search(tvg_name)
     year = year_match.group(0) if year_match else ''
-    # Remove all parentheses content (including year and other info)
-    tvg_name = re.sub(r'\s*\([^()]*\)', '', tvg_name).strip()
+    # Remove language prefix like "EN - ", "NF - ", "D+ - ", etc. and all
+    # parentheses content (including year and other info) in one pass
+    tvg_name = _RE_MOVIE_NOISE.sub('', tvg_name).strip()
     
     # Remove actor names in all caps at the end (before year was removed)
     # Only remove if there's mixed-case content before it (indicating it's an actor name, not the title)
     # Pattern: mixed-case title + space + ALL_CAPS_NAME (one or more words, all caps, optional comma)
     # Examples: "The Pledge JACK NICHOLSON", "Movie Name BRAD PITT", "All The President's Men DUSTIN HOFFMAN,"
     # Don't remove if entire title is all caps (e.g., "JACK RYAN")
-    if re.search(r'[a-z]', tvg_name):  # Has lowercase letters (mixed case)
+    if _RE_LOWERCASE.search(tvg_name):  # Has lowercase letters (mixed case)
         # Match all-caps words at the end (2+ letters, can be multiple words, optional comma)
-        tvg_name = re.sub(r'\s+[A-Z]{2,}(?:\s+[A-Z]{2,})*,?\s*$', '', tvg_name).strip()
+        tvg_name = _RE_ACTOR_SUFFIX.sub('', tvg_name).strip()
     
     # Add year back if it was present
     if year:
         tvg_name += f" {year}"
     return safe_filename(tvg_name)
 
+@lru_cache(maxsize=_NAME_CACHE_SIZE)
 def parse_series_name(tvg_name: str):
-    # Remove language prefix like "EN - ", "NF - ", "D+ - ", "SPT - ", "SHWT - ", etc.
-    tvg_name = re.sub(r'^[A-Z0-9+]{1,4}\s*-\s*', '', tvg_name).strip()
     # Extract year (can appear before or after season/episode)
-    year_match = re.search(r'\((\d{4})\)', tvg_name)
+    year_match = _RE_YEAR.search(tvg_name)
     year = year_match.group(0) if year_match else ''
-    # Remove season/episode from name first (handles "S01 E02", "S01E02", ".S01E06", " - S01E02 - Episode Title", etc.)
-    # Updated regex to handle dashes and episode titles after season/episode
-    tvg_name = re.sub(r'[\s\-\.]+S\d{1,2}\s*E\d{1,2}.*$', '', tvg_name, flags=re.IGNORECASE).strip()
+    # Remove language prefix like "EN - ", "NF - ", "D+ - ", "SPT - ", "SHWT - ", etc.
+    # and season/episode (handles "S01 E02", "S01E02", ".S01E06", " - S01E02 - Episode Title", etc.)
+    # in one pass; the tail must go before parentheses so "(... S01E02)" is handled as before
+    tvg_name = _RE_SERIES_NOISE.sub('', tvg_name.strip())
     # Remove all parentheses content (including year, country codes like "(US)", etc.)
-    tvg_name = re.sub(r'\s*\([^()]*\)', '', tvg_name).strip()
+    tvg_name = _RE_PARENS.sub('', tvg_name).strip()
     # Add year back if it was present
     if year:
         tvg_name += f" {year}"
@@ -127,13 +246,11 @@ def parse_series_name(tvg_name: str):
 
 def extract_season_episode(tvg_name: str):
     # Match "S01E02", "S01 E02", "S1E2", etc. (case insensitive)
-    match = re.search(r'S(\d{1,2})\s*E(\d{1,2})', tvg_name, re.IGNORECASE)
+    match = _RE_SEASON_EPISODE.search(tvg_name)
     if match:
         season_num = int(match.group(1))
         episode_num = int(match.group(2))
-        season = f"Season {season_num}"
-        episode = f"S{season_num:02d}E{episode_num:02d}"
-        return season, episode
+        return f"Season {season_num}", f"S{_TWO_DIGITS[season_num]}E{_TWO_DIGITS[episode_num]}"
     return "Season 1", "S01E01"
 
 def extract_content_id(url: str) -> Optional[str]:
@@ -144,7 +261,7 @@ def extract_content_id(url: str) -> Optional[str]:
     - http://example.com/series/.../859140.mkv -> "859140"
     """
     # Match the last number before the file extension
-    match = re.search(r'/(\d+)\.(mp4|mkv|avi|mov|m4v)$', url, re.IGNORECASE)
+    match = _RE_CONTENT_ID.search(url)
     if match:
         return match.group(1)
     return None
@@ -158,7 +275,7 @@ def extract_country_code(tvg_name: str) -> Optional[str]:
     - "US| CNN" -> "US"
     - "Regular Channel" -> None
     """
-    match = re.match(r'^([A-Z]{2})\|', tvg_name)
+    match = _RE_COUNTRY_CODE.match(tvg_name)
     if match:
         return match.group(1)
     return None
@@ -198,6 +315,61 @@ def should_filter_channel(tvg_name: str, include_codes: Set[str], filter_codes:
     # No filtering configured
     return False
 
+def read_strm_url(filepath: Union[Path, str]) -> Optional[str]:
+    """
+    Return the URL stored in a STRM file, or None if it can't be read.
+    Results are cached and only re-read when the file's mtime or size changes.
+    """
+    path_str = os.fspath(filepath)
+    try:
+        st = os.stat(path_str)
+        cached = _URL_CACHE.get(path_str)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        with open(path_str, encoding="utf-8") as f:
+            url = f.read().strip()
+    except Exception:
+        _URL_CACHE.pop(path_str, None)
+        return None
+    _URL_CACHE[path_str] = (st.st_mtime_ns, st.st_size, url)
+    return url
+
+def strm_has_url(filepath: Union[Path, str], url: str) -> bool:
+    """
+    Return True if the STRM file already holds url.
+    A file with fewer bytes than the URL has characters can't match (UTF-8 never encodes
+    a character in less than one byte), and a cached URL is trusted while mtime and size
+    are unchanged, so both cases are answered from a single stat without encoding the URL.
+    """
+    path_str = os.fspath(filepath)
+    try:
+        st = os.stat(path_str)
+    except OSError:
+        return False
+    if st.st_size < len(url):
+        return False
+    cached = _URL_CACHE.get(path_str)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2] == url
+    return read_strm_url(path_str) == url
+
+def find_strm_with_url(directory: Path, url: str) -> Optional[Path]:
+    """
+    Return the STRM file in directory that already holds url, or None.
+    A single scandir covers both the existence check and the listing; candidates are
+    checked by their path strings and only the match is turned into a Path.
+    """
+    try:
+        with os.scandir(directory) as it:
+            candidates = [(entry.name, entry.path) for entry in it if entry.name.endswith(".strm")]
+    except OSError:
+        # Missing or unreadable directory - treat as no existing file
+        return None
+    for name, path_str in candidates:
+        if strm_has_url(path_str, url):
+            return directory / name
+    return None
+
 def write_strm_file(directory: Path, filename: str, url: str, content_id: Optional[str] = None) -> Tuple[Path, bool, bool]:
     """
     Write a STRM file and return the filepath, whether it was newly created, and if URL changed.
@@ -208,14 +380,27 @@ def write_strm_file(directory: Path, filename: str, url: str, content_id: Option
     the base file from being replaced with different IDs on subsequent runs.
     Returns: (filepath, is_new, url_changed)
     """
-    directory.mkdir(parents=True, exist_ok=True)
+    dir_key = os.fspath(directory)
+    if dir_key not in _MKDIR_CACHE:
+        directory.mkdir(parents=True, exist_ok=True)
+        _MKDIR_CACHE.add(dir_key)
     
-    base_filepath = directory / f"{filename}.strm"
+    base_name = f"{filename}.strm"
+    base_filepath = directory / base_name
+    
+    # List the directory once; existence checks below are set lookups instead of stat calls
+    try:
+        with os.scandir(directory) as it:
+            existing_names = {entry.name for entry in it}
+    except FileNotFoundError:
+        # Directory was removed after it was cached (e.g. by cleanup) - recreate it
+        directory.mkdir(parents=True, exist_ok=True)
+        existing_names = set()
     
     # Check if multiple versions already exist (base file + any ID files)
-    existing_strm_files = list(directory.glob(f"{filename}*.strm"))
-    has_id_files = any(f.name != f"{filename}.strm" and "[" in f.name for f in existing_strm_files)
-    has_base_file = base_filepath.exists()
+    existing_strm_files = [name for name in existing_names if name.startswith(filename) and name.endswith(".strm")]
+    has_id_files = any(name != base_name and "[" in name for name in existing_strm_files)
+    has_base_file = base_name in existing_names
     has_multiple_versions = (has_base_file and has_id_files) or len(existing_strm_files) > 1
     
     # If multiple versions exist, always use ID-based filenames for all versions
@@ -225,27 +410,23 @@ def write_strm_file(directory: Path, filename: str, url: str, content_id: Option
             # Multiple versions exist - check if base file has this ID
             # If so, we should migrate it to ID-based filename to maintain consistency
             id_filepath = directory / f"{filename} [{content_id}].strm"
-            if base_filepath.exists() and not id_filepath.exists():
+            id_exists = id_filepath.name in existing_names
+            if has_base_file and not id_exists:
                 # Check if base file has the same ID - if so, we'll use the ID-based filename
                 # This ensures all versions use ID-based filenames when multiple exist
-                try:
-                    existing_url = base_filepath.read_text(encoding="utf-8").strip()
-                    existing_id = extract_content_id(existing_url)
-                    if existing_id == content_id:
-                        # Base file has this ID - use ID-based filename for consistency
-                        final_filepath = id_filepath
-                        logger.debug(f"Migrating base file to ID-based filename {final_filepath.name} (multiple versions exist)")
-                    else:
-                        # Base file has different ID - use ID-based filename for new version
-                        final_filepath = id_filepath
-                        logger.debug(f"Multiple versions detected: using ID-based filename {final_filepath.name}")
-                except Exception:
-                    # Error reading base file - use ID-based filename
+                existing_url = read_strm_url(base_filepath)
+                if existing_url is not None and extract_content_id(existing_url) == content_id:
+                    # Base file has this ID - use ID-based filename for consistency
+                    final_filepath = id_filepath
+                    logger.debug(f"Migrating base file to ID-based filename {final_filepath.name} (multiple versions exist)")
+                else:
+                    # Base file has different ID (or couldn't be read) - use ID-based filename for new version
                     final_filepath = id_filepath
+                    logger.debug(f"Multiple versions detected: using ID-based filename {final_filepath.name}")
             else:
                 # ID-based file already exists or base file doesn't exist - use ID-based filename
                 final_filepath = id_filepath
-                if id_filepath.exists():
+                if id_exists:
                     logger.debug(f"Using existing ID-based file {final_filepath.name}")
                 else:
                     logger.debug(f"Multiple versions detected: using ID-based filename {final_filepath.name}")
@@ -255,24 +436,21 @@ def write_strm_file(directory: Path, filename: str, url: str, content_id: Option
             final_filepath = base_filepath
     elif content_id:
         # No multiple versions yet - check if we need to create a new version
-        if base_filepath.exists():
-            try:
-                existing_url = base_filepath.read_text(encoding="utf-8").strip()
-                existing_id = extract_content_id(existing_url)
-                # If existing file has different ID, create new file with ID appended
-                if existing_id and existing_id != content_id:
-                    final_filepath = directory / f"{filename} [{content_id}].strm"
-                    logger.debug(f"Duplicate version detected: creating {final_filepath.name} (existing: {existing_id}, new: {content_id})")
-                else:
-                    # Same ID or no ID in existing file - use base file
-                    final_filepath = base_filepath
-            except Exception:
-                # Error reading existing file - use base file
+        if has_base_file:
+            # Cached read - the unchanged check usually loaded this file already
+            existing_url = read_strm_url(base_filepath)
+            existing_id = extract_content_id(existing_url) if existing_url is not None else None
+            # If existing file has different ID, create new file with ID appended
+            if existing_id and existing_id != content_id:
+                final_filepath = directory / f"{filename} [{content_id}].strm"
+                logger.debug(f"Duplicate version detected: creating {final_filepath.name} (existing: {existing_id}, new: {content_id})")
+            else:
+                # Same ID, no ID or unreadable existing file - use base file
                 final_filepath = base_filepath
         else:
             # Check if a file with this ID already exists
             id_filepath = directory / f"{filename} [{content_id}].strm"
-            if id_filepath.exists():
+            if id_filepath.name in existing_names:
                 final_filepath = id_filepath
             else:
                 # Use base filename for first version (no duplicates yet)
@@ -281,18 +459,24 @@ def write_strm_file(directory: Path, filename: str, url: str, content_id: Option
         # No content ID - always use base filename
         final_filepath = base_filepath
     
-    is_new = not final_filepath.exists()
+    is_new = final_filepath.name not in existing_names
     
     # Read existing content to check if URL changed
     url_changed = False
     if not is_new:
-        try:
-            existing_url = final_filepath.read_text(encoding="utf-8").strip()
-            url_changed = existing_url != url
-        except Exception:
-            url_changed = True
+        url_changed = not strm_has_url(final_filepath, url)
+        if not url_changed:
+            # Unchanged - skip the write so mtime stays put and Emby doesn't rescan
+            return final_filepath, is_new, url_changed
     
-    final_filepath.write_text(url, encoding="utf-8")
+    # Single open/write/close on the raw fd, then fstat for the URL cache
+    fd = os.open(final_filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        os.write(fd, url.encode("utf-8"))
+        st = os.fstat(fd)
+    finally:
+        os.close(fd)
+    _URL_CACHE[os.fspath(final_filepath)] = (st.st_mtime_ns, st.st_size, url)
     if is_new:
         logger.debug(f"Created new STRM file: {final_filepath}")
     elif url_changed:
@@ -304,27 +488,54 @@ def convert_to_emby_path(file_path: Path) -> str:
     Convert container path to the path that Emby sees on the host.
     Uses path mapping environment variables if set.
     """
-    path_str = str(file_path)
+    path_str = os.fspath(file_path)
     
     # Map container paths to host paths if environment variables are set
-    if EMBY_MOVIES_PATH and path_str.startswith(str(MOVIES_DIR)):
-        # Replace container movies path with host path
-        relative_path = path_str[len(str(MOVIES_DIR)):].lstrip('/')
-        return str(Path(EMBY_MOVIES_PATH) / relative_path) if relative_path else EMBY_MOVIES_PATH
-    
-    if EMBY_SERIES_PATH and path_str.startswith(str(SERIES_DIR)):
-        # Replace container series path with host path
-        relative_path = path_str[len(str(SERIES_DIR)):].lstrip('/')
-        return str(Path(EMBY_SERIES_PATH) / relative_path) if relative_path else EMBY_SERIES_PATH
-    
-    if EMBY_LIVETV_PATH and path_str.startswith(str(LIVETV_DIR)):
-        # Replace container livetv path with host path
-        relative_path = path_str[len(str(LIVETV_DIR)):].lstrip('/')
-        return str(Path(EMBY_LIVETV_PATH) / relative_path) if relative_path else EMBY_LIVETV_PATH
+    # Plain string prefix arithmetic - no intermediate Path objects
+    for container_dir, host_path in (
+        (MOVIES_DIR, EMBY_MOVIES_PATH),
+        (SERIES_DIR, EMBY_SERIES_PATH),
+        (LIVETV_DIR, EMBY_LIVETV_PATH),
+    ):
+        if not host_path:
+            continue
+        container_str = os.fspath(container_dir)
+        if path_str.startswith(container_str):
+            # Replace container path with host path
+            relative_path = path_str[len(container_str):].lstrip('/')
+            return f"{host_path.rstrip('/')}/{relative_path}" if relative_path else host_path
     
     # If no mapping is set, return original path (assumes paths match)
     return path_str
 
+def get_emby_path_index() -> Optional[Dict[str, str]]:
+    """
+    Fetch every Emby item with its path in a single request.
+    Returns a mapping of Emby (host) path -> item ID, or None if Emby isn't configured
+    or the request fails.
+    """
+    if not EMBY_SERVER_URL or not EMBY_API_KEY:
+        return None
+    
+    try:
+        url = f"{EMBY_SERVER_URL.rstrip('/')}/emby/Items"
+        params = {
+            "Recursive": "true",
+            "IsFolder": "false",
+            "Fields": "Path"
+        }
+        headers = {
+            "X-Emby-Token": EMBY_API_KEY
+        }
+        
+        resp = _SESSION.get(url, params=params, headers=headers, timeout=60)
+        resp.raise_for_status()
+        
+        return {item["Path"]: item["Id"] for item in resp.json().get("Items", []) if item.get("Path")}
+    except Exception as e:
+        logger.warning(f"⚠️ Error fetching Emby item paths: {e}")
+        return None
+
 def get_emby_item_by_path(file_path: Path) -> Optional[str]:
     """
     Find an Emby item ID by file path.
@@ -336,6 +547,9 @@ def get_emby_item_by_path(file_path: Path) -> Optional[str]:
     try:
         # Convert container path to Emby host path
         path_str = convert_to_emby_path(file_path)
+        item_id = _EMBY_ITEM_IDS.get(path_str)
+        if item_id:
+            return item_id
         logger.debug(f"Looking up Emby item for path: {path_str} (container: {file_path})")
         
         # Query Emby for items at this path
@@ -348,12 +562,14 @@ def get_emby_item_by_path(file_path: Path) -> Optional[str]:
             "X-Emby-Token": EMBY_API_KEY
         }
         
-        resp = requests.get(url, params=params, headers=headers, timeout=10)
+        resp = _SESSION.get(url, params=params, headers=headers, timeout=10)
         resp.raise_for_status()
         
         data = resp.json()
         if "Items" in data and len(data["Items"]) > 0:
-            return data["Items"][0]["Id"]
+            item_id = data["Items"][0]["Id"]
+            _EMBY_ITEM_IDS[path_str] = item_id
+            return item_id
         
         return None
     except Exception as e:
@@ -381,7 +597,7 @@ def refresh_emby_item(item_id: str, update_type: str = "Update"):
             "X-Emby-Token": EMBY_API_KEY
         }
         
-        resp = requests.post(url, params=params, headers=headers, timeout=10)
+        resp = _SESSION.post(url, params=params, headers=headers, timeout=10)
         resp.raise_for_status()
         logger.info(f"✅ Emby item {item_id} refreshed ({update_type})")
         return True
@@ -413,7 +629,7 @@ def refresh_emby_library_path(path: Path):
             "X-Emby-Token": EMBY_API_KEY
         }
         
-        resp = requests.post(url, params=params, headers=headers, timeout=10)
+        resp = _SESSION.post(url, params=params, headers=headers, timeout=10)
         resp.raise_for_status()
         logger.info(f"✅ Emby library refresh triggered for {path} (will scan for new files)")
         return True
@@ -435,7 +651,7 @@ def delete_emby_item(item_id: str):
             "X-Emby-Token": EMBY_API_KEY
         }
         
-        resp = requests.delete(url, headers=headers, timeout=10)
+        resp = _SESSION.delete(url, headers=headers, timeout=10)
         resp.raise_for_status()
         logger.info(f"✅ Emby item {item_id} deleted from library")
         return True
@@ -443,24 +659,39 @@ def delete_emby_item(item_id: str):
         logger.warning(f"⚠️ Error deleting Emby item {item_id}: {e}")
         return False
 
-def notify_emby_updated(filepath: Path):
+def notify_emby_updated_files(filepaths: List[Path], refreshed_directories: Set[Path] = frozenset()):
     """
-    Notify Emby about an updated STRM file (URL changed).
-    Finds the item and refreshes it directly (more efficient than library scan).
+    Notify Emby about a batch of updated STRM files once processing is done.
+    Items found by path are refreshed directly; files Emby doesn't know yet fall back to
+    one library refresh per parent directory instead of one per file.
+    Directories in refreshed_directories were already refreshed for new files and are skipped.
     """
     if not EMBY_SERVER_URL or not EMBY_API_KEY:
-        logger.debug(f"Emby notification skipped (not configured) for {filepath}")
+        logger.debug(f"Emby notification skipped (not configured) for {len(filepaths)} updated file(s)")
         return
     
-    # For updated items (URL changed), find the item and refresh it directly
-    # This avoids full library scans and only updates the specific item
-    item_id = get_emby_item_by_path(filepath)
-    if item_id:
-        refresh_emby_item(item_id, "Update")
-    else:
-        # If item not found, try library refresh as fallback
-        logger.warning(f"⚠️ Item not found in Emby for {filepath}, triggering library refresh")
-        refresh_emby_library_path(filepath.parent)
+    if not filepaths:
+        return
+    
+    def refresh_updated_item(filepath: Path) -> Optional[Path]:
+        # Returns the parent directory when the item still needs a library refresh
+        item_id = get_emby_item_by_path(filepath)
+        if item_id:
+            if refresh_emby_item(item_id, "Update"):
+                return None
+            # The cached ID may be stale (item removed from Emby) - look it up again next time
+            # and let the library refresh pick the file up now, as for an unknown item
+            _EMBY_ITEM_IDS.pop(convert_to_emby_path(filepath), None)
+            logger.warning(f"⚠️ Refresh failed for {filepath}, queueing library refresh")
+            return filepath.parent
+        logger.warning(f"⚠️ Item not found in Emby for {filepath}, queueing library refresh")
+        return filepath.parent
+    
+    # Lookups and refreshes are independent I/O, so overlap them on the shared session
+    with ThreadPoolExecutor(max_workers=min(EMBY_MAX_WORKERS, len(filepaths))) as executor:
+        missing_directories = {d for d in executor.map(refresh_updated_item, filepaths) if d is not None}
+    
+    batch_refresh_directories(missing_directories - set(refreshed_directories))
 
 def batch_refresh_directories(directories: Set[Path]):
     """
@@ -474,128 +705,253 @@ def batch_refresh_directories(directories: Set[Path]):
         return
     
     logger.info(f"Triggering Emby library refresh for {len(directories)} directory/directories with new files")
-    for directory in directories:
-        # For new items, trigger library refresh for the parent directory
-        # This will scan the directory and add new STRM files to Emby's library
-        # The Library/Refresh endpoint triggers an actual library scan, not just a search
-        refresh_emby_library_path(directory)
+    # For new items, trigger library refresh for the parent directory
+    # This will scan the directory and add new STRM files to Emby's library
+    # The Library/Refresh endpoint triggers an actual library scan, not just a search
+    # Refreshes are issued concurrently (bounded by EMBY_MAX_WORKERS)
+    with ThreadPoolExecutor(max_workers=min(EMBY_MAX_WORKERS, len(directories))) as executor:
+        list(executor.map(refresh_emby_library_path, directories))
+
+def _has_strm(path: str) -> bool:
+    """Return True as soon as a .strm file is found anywhere under path."""
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".strm"):
+                    return True
+    return False
 
 def cleanup_empty_dirs(base_dir: Path):
-    for d in base_dir.iterdir():
-        if d.is_dir() and not any(f.suffix == ".strm" for f in d.rglob("*")):
+    with os.scandir(base_dir) as it:
+        directories = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+    for d in directories:
+        if not _has_strm(d):
             logger.info(f"🗑 Removing empty or orphaned directory: {d}")
-            for f in d.rglob("*"):
-                f.unlink()
-            d.rmdir()
+            shutil.rmtree(d)
 
-def find_all_strm_files(base_dir: Path) -> Set[Path]:
-    """Find all existing STRM files in a directory."""
+def find_all_strm_files(base_dir: Path) -> Set[str]:
+    """Find all existing STRM files in a directory, as path strings."""
     strm_files = set()
     if base_dir.exists():
-        for strm_file in base_dir.rglob("*.strm"):
-            strm_files.add(strm_file)
+        # Iterative scandir walk: file types come from the directory entries, no glob matching
+        stack = [os.fspath(base_dir)]
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".strm"):
+                        strm_files.add(entry.path)
     return strm_files
 
-def cleanup_orphaned_files(processed_files: Set[Path], base_dir: Path, content_type: str):
-    """Remove STRM files that exist in the directory but weren't in the current playlist."""
+def strm_index_file(base_dir: Path) -> Path:
+    """Return the index file recording the STRM files under base_dir."""
+    return STATE_DIR / f"{base_dir.name}{STRM_INDEX_NAME}"
+
+def take_strm_index(base_dir: Path) -> Tuple[Optional[Set[str]], int]:
+    """
+    Load and remove the index of STRM files recorded by the previous orphan cleanup.
+    Removing it up front means a run that fails part-way leaves no stale index behind,
+    so the next run falls back to a full directory scan.
+    Returns (recorded path strings, runs since the last full scan). The paths are None if
+    there is no usable index or it has been used for STRM_INDEX_MAX_RUNS runs already.
+    """
+    index_file = strm_index_file(base_dir)
+    try:
+        header, *lines = index_file.read_text(encoding="utf-8").splitlines()
+        index_file.unlink()
+        runs = int(header.removeprefix("#runs="))
+    except Exception:
+        return None, 0
+    if runs >= STRM_INDEX_MAX_RUNS:
+        logger.debug(f"STRM index {index_file} used for {runs} runs, rescanning {base_dir}")
+        return None, 0
+    return {line for line in lines if line}, runs
+
+def save_strm_index(base_dir: Path, files: Set[str], runs: int = 0):
+    """
+    Record the STRM files (path strings) present after orphan cleanup for the next run,
+    with the number of runs since the index was last validated by a full scan.
+    """
+    index_file = strm_index_file(base_dir)
+    tmp_file = index_file.with_name(index_file.name + ".part")
+    try:
+        STATE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file.write_text("\n".join([f"#runs={runs}", *sorted(files)]), encoding="utf-8")
+        os.replace(tmp_file, index_file)
+    except Exception as e:
+        logger.warning(f"⚠️ Error saving STRM index {index_file}: {e}")
+
+def cleanup_orphaned_files(processed_files: Set[Path], base_dir: Path, content_type: str,
+                           known_files: Optional[Set[str]] = None, index_runs: int = 0):
+    """
+    Remove STRM files that exist in the directory but weren't in the current playlist.
+    known_files and index_runs come from the previous run's index (see take_strm_index);
+    when known_files is given it replaces the full directory walk. The processed files,
+    plus any orphans that couldn't be removed, are saved as the next index so those
+    orphans are retried.
+    """
     if not REMOVE_ORPHANED:
         return
     
-    existing_files = find_all_strm_files(base_dir)
-    orphaned_files = existing_files - processed_files
+    # Compare plain path strings; only the orphans are turned back into Path objects
+    processed_paths = frozenset(map(os.fspath, processed_files))
+    existing_files = known_files if known_files is not None else find_all_strm_files(base_dir)
+    orphaned_files = [Path(f) for f in existing_files - processed_paths]
+    index_paths = processed_paths
     
     if orphaned_files:
         logger.info(f"Found {len(orphaned_files)} orphaned {content_type} STRM file(s) to remove")
-        deleted_count = 0
-        for orphaned_file in orphaned_files:
+        # Look up all orphans against one prefetched path index instead of one request each;
+        # fall back to per-file lookups if the index couldn't be fetched
+        emby_index = get_emby_path_index()
+        
+        def remove_orphan(orphaned_file: Path) -> Tuple[bool, bool]:
+            # Returns (deleted from Emby, removed from disk)
+            deleted = False
+            removed = False
             try:
                 # Try to find and delete the item from Emby before removing the file
                 if EMBY_SERVER_URL and EMBY_API_KEY:
-                    item_id = get_emby_item_by_path(orphaned_file)
+                    if emby_index is not None:
+                        item_id = emby_index.get(convert_to_emby_path(orphaned_file))
+                    else:
+                        item_id = get_emby_item_by_path(orphaned_file)
                     if item_id:
                         delete_emby_item(item_id)
-                        deleted_count += 1
+                        _EMBY_ITEM_IDS.pop(convert_to_emby_path(orphaned_file), None)
+                        deleted = True
                     else:
                         logger.debug(f"Item not found in Emby for {orphaned_file}, skipping Emby deletion")
                 
-                # Remove the file from filesystem
-                orphaned_file.unlink()
+                # Remove the file from filesystem (already gone counts as removed, so a
+                # file deleted by hand doesn't stay in the index forever)
+                orphaned_file.unlink(missing_ok=True)
+                removed = True
                 logger.debug(f"🗑 Removed orphaned file: {orphaned_file}")
             except Exception as e:
                 logger.warning(f"⚠️ Error removing orphaned file {orphaned_file}: {e}")
+            return deleted, removed
+        
+        # Emby deletions are independent I/O, so run them concurrently
+        with ThreadPoolExecutor(max_workers=min(EMBY_MAX_WORKERS, len(orphaned_files))) as executor:
+            results = list(executor.map(remove_orphan, orphaned_files))
+        deleted_count = sum(deleted for deleted, _ in results)
+        # Orphans still on disk stay in the index so the next run finds and retries them
+        failed_paths = [os.fspath(f) for f, (_, removed) in zip(orphaned_files, results) if not removed]
+        if failed_paths:
+            index_paths = processed_paths.union(failed_paths)
         
         if deleted_count > 0:
             logger.info(f"✅ Deleted {deleted_count} orphaned {content_type} item(s) from Emby library")
         
         # Clean up empty directories after removing orphaned files
         cleanup_empty_dirs(base_dir)
+    
+    if base_dir.exists():
+        save_strm_index(base_dir, index_paths, index_runs + 1 if known_files is not None else 0)
+
+def iter_playlist_entries(playlist: Path) -> Iterator[Tuple[str, str, str, str, str]]:
+    """
+    Yield (info, tvg_name, group_title, category, url) for every #EXTINF entry in the playlist.
+    The file is memory-mapped and scanned with a single bytes regex sweep, so only the
+    captured fields are decoded; tvg_name/group_title are empty when not present.
+    category is "movie" or "series" from the URL path, or "" for everything else (live TV).
+    """
+    with open(playlist, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # finditer keeps the scan lazy: one match is held at a time, not the whole playlist
+            for m in _RE_PLAYLIST_ENTRY.finditer(mm):
+                info, tvg_name, group_title, movie, series, url = m.groups(b"")
+                category = "movie" if movie else "series" if series else ""
+                yield info.decode("utf-8"), tvg_name.decode("utf-8"), group_title.decode("utf-8"), category, url.decode("utf-8")
+
+@contextmanager
+def live_tv_writer(live_file: Path) -> Iterator[Callable[[str, str], None]]:
+    """
+    Stream live TV entries to a temporary file next to live_file instead of building the
+    whole playlist in memory. Yields write_entry(info, url); entries are joined by newlines.
+    The temporary file replaces live_file when the block completes, and is removed if the
+    block fails or no entries were written.
+    """
+    tmp_file = live_file.with_name(live_file.name + ".part")
+    fh = None
+
+    def write_entry(info: str, url: str):
+        nonlocal fh
+        if fh is None:
+            live_file.parent.mkdir(parents=True, exist_ok=True)
+            fh = open(tmp_file, "w", encoding="utf-8")
+        else:
+            fh.write("\n")
+        fh.write(info)
+        fh.write("\n")
+        fh.write(url)
+
+    try:
+        yield write_entry
+        if fh is not None:
+            fh.close()
+            os.replace(tmp_file, live_file)
+            logger.debug(f"Live TV playlist saved to {live_file}")
+    finally:
+        if fh is not None:
+            fh.close()
+        tmp_file.unlink(missing_ok=True)
 
-def process_playlist():
+def process_playlist() -> bool:
+    """
+    Parse the downloaded playlist and sync STRM files, live TV and Emby.
+    Returns False if MAX_ITEMS_PER_RUN left items for a later run, True otherwise.
+    """
     movies = []
     series = []
-    live_tv = []
+    live_tv_count = 0
+    # Bucket dispatch by URL category; anything else is live TV
+    buckets = {"movie": movies.append, "series": series.append}
 
-    lines = TMP_PLAYLIST.read_text(encoding="utf-8").splitlines()
-    logger.debug(f"Playlist has {len(lines)} total lines")
-    
     extinf_count = 0
     no_tvg_name_count = 0
     filtered_live_tv_count = 0
-    i = 0
-    while i < len(lines):
-        if not lines[i].startswith("#EXTINF"):
-            i += 1
-            continue
-        extinf_count += 1
-        info = lines[i]
-        url = lines[i+1] if i+1 < len(lines) else ""
-        i += 2
-
-        tvg_match = re.search(r'tvg-name="([^"]+)"', info)
-        tvg_name = tvg_match.group(1).strip() if tvg_match else ""
-
-        if not tvg_name:
-            # Skip items without tvg-name
-            no_tvg_name_count += 1
-            logger.debug(f"Skipping item without tvg-name: {info[:100]}...")
-            continue
+    logger.debug(f"Playlist is {TMP_PLAYLIST.stat().st_size} bytes")
+    with live_tv_writer(LIVETV_DIR / "livetv.m3u") as write_live_entry:
+        for info, tvg_name, group_title, category, url in iter_playlist_entries(TMP_PLAYLIST):
+            extinf_count += 1
+            tvg_name = tvg_name.strip()
 
-        # Extract group-title for classification (for logging/debugging)
-        group_match = re.search(r'group-title="([^"]+)"', info)
-        group_title = group_match.group(1).strip().lower() if group_match else ""
-        
-        # URL pattern is the most reliable indicator
-        # Movies: /movie/ in URL path
-        # Series: /series/ in URL path
-        # Live TV: neither pattern (just username/password/number)
-        url_lower = url.lower()
-        is_series = False
-        is_movie = False
-        
-        # Check URL patterns first (most reliable)
-        # Look for /movie/ or /series/ as path segments
-        if "/movie/" in url_lower:
-            is_movie = True
-        elif "/series/" in url_lower:
-            is_series = True
-        # If URL doesn't have /movie/ or /series/, it's live TV
-        # (regardless of group-title)
-        
-        if is_series:
-            series.append((tvg_name, url))
-            logger.debug(f"Found series: {tvg_name} (group: {group_title})")
-        elif is_movie:
-            movies.append((tvg_name, url))
-            logger.debug(f"Found movie: {tvg_name} (group: {group_title})")
-        else:
-            # Check if this live TV channel should be filtered
-            if should_filter_channel(tvg_name, INCLUDE_COUNTRY_CODES, FILTER_COUNTRY_CODES):
-                filtered_live_tv_count += 1
-                country_code = extract_country_code(tvg_name)
-                logger.debug(f"Filtered live TV channel: {tvg_name} (country code: {country_code})")
+            if not tvg_name:
+                # Skip items without tvg-name
+                no_tvg_name_count += 1
+                logger.debug(f"Skipping item without tvg-name: {info[:100]}...")
+                continue
+
+            # group-title is only used for logging/debugging
+            group_title = group_title.strip().lower()
+
+            # URL pattern is the most reliable indicator (category is matched during the scan)
+            # Movies: /movie/ in URL path (takes precedence)
+            # Series: /series/ in URL path
+            # Live TV: neither pattern (just username/password/number), regardless of group-title
+            add_to_bucket = buckets.get(category)
+            if add_to_bucket is not None:
+                # Stripped like read_strm_url reads it back, so the STRM comparison is stable
+                add_to_bucket((tvg_name, url.strip()))
+                logger.debug(f"Found {category}: {tvg_name} (group: {group_title})")
             else:
-                live_tv.append(info + "\n" + url)
-    
+                # Check if this live TV channel should be filtered
+                if should_filter_channel(tvg_name, INCLUDE_COUNTRY_CODES, FILTER_COUNTRY_CODES):
+                    filtered_live_tv_count += 1
+                    country_code = extract_country_code(tvg_name)
+                    logger.debug(f"Filtered live TV channel: {tvg_name} (country code: {country_code})")
+                else:
+                    write_live_entry(info, url)
+                    live_tv_count += 1
+
     logger.info(f"Found {extinf_count} #EXTINF entries")
     if no_tvg_name_count > 0:
         logger.warning(f"Skipped {no_tvg_name_count} entries without tvg-name")
@@ -609,11 +965,11 @@ def process_playlist():
     if filtered_live_tv_count > 0:
         logger.info(f"Filtered out {filtered_live_tv_count} live TV channel(s) based on country code rules")
     
-    logger.info(f"Classified: {len(movies)} movies, {len(series)} series, {len(live_tv)} live TV")
+    logger.info(f"Classified: {len(movies)} movies, {len(series)} series, {live_tv_count} live TV")
 
     # Safety check: If playlist is empty or has no valid entries, skip orphan cleanup
     # This prevents mass deletion when download fails or playlist is invalid
-    total_valid_items = len(movies) + len(series) + len(live_tv)
+    total_valid_items = len(movies) + len(series) + live_tv_count
     if total_valid_items == 0:
         logger.warning("⚠️ Playlist contains no valid items (0 movies, 0 series, 0 live TV)")
         logger.warning("⚠️ Skipping orphan cleanup to prevent accidental mass deletion")
@@ -625,7 +981,7 @@ def process_playlist():
                 logger.info(f"🗑 Deleted invalid playlist file {TMP_PLAYLIST} (will be redownloaded next run)")
             except Exception as e:
                 logger.warning(f"⚠️ Error deleting invalid playlist file {TMP_PLAYLIST}: {e}")
-        return
+        return True
 
     # Track all processed files for orphan cleanup
     processed_movie_files = set()
@@ -635,9 +991,17 @@ def process_playlist():
     new_movie_directories = set()
     new_series_directories = set()
     
+    # Track updated files (URL changed) for batched item refresh
+    updated_movie_files = []
+    updated_series_files = []
+    
     # Track total items processed (for limit)
     total_items_processed = 0
     items_limit_reached = False
+    
+    # STRM files recorded by the previous orphan cleanup (None -> full scan)
+    known_movie_files, movie_index_runs = take_strm_index(MOVIES_DIR) if REMOVE_ORPHANED else (None, 0)
+    known_series_files, series_index_runs = take_strm_index(SERIES_DIR) if REMOVE_ORPHANED else (None, 0)
 
     # Process movies
     logger.info(f"Processing {len(movies)} movie(s)")
@@ -648,6 +1012,10 @@ def process_playlist():
     movies_updated = 0
     movies_processed = 0
     movies_skipped_unchanged = 0
+    # Bind per-item bookkeeping methods once instead of looking them up every iteration
+    add_processed = processed_movie_files.add
+    add_new_dir = new_movie_directories.add
+    add_updated = updated_movie_files.append
     for tvg_name, url in movies:
         folder_name = parse_movie_name(tvg_name)
         content_id = extract_content_id(url)
@@ -656,26 +1024,14 @@ def process_playlist():
         # When multiple versions exist, check all .strm files in the directory
         # to avoid processing items that already exist in any file
         movie_dir = MOVIES_DIR / folder_name
-        base_filepath = movie_dir / f"{folder_name}.strm"
         
         # Check all existing .strm files in the directory to see if URL already exists
-        is_unchanged = False
-        existing_filepath = None
-        if movie_dir.exists():
-            for filepath in movie_dir.glob("*.strm"):
-                try:
-                    existing_url = filepath.read_text(encoding="utf-8").strip()
-                    if existing_url == url:
-                        is_unchanged = True
-                        existing_filepath = filepath
-                        break
-                except Exception:
-                    pass
+        existing_filepath = find_strm_with_url(movie_dir, url)
         
         # Skip unchanged items (don't count towards limit, but track for orphan cleanup)
-        if is_unchanged and existing_filepath:
+        if existing_filepath:
             movies_skipped_unchanged += 1
-            processed_movie_files.add(existing_filepath)
+            add_processed(existing_filepath)
             continue
         
         # Check if limit reached for items that need processing
@@ -686,19 +1042,19 @@ def process_playlist():
             break
         
         # Process the item (new or changed)
-        filepath, is_new, url_changed = write_strm_file(MOVIES_DIR / folder_name, folder_name, url, content_id)
-        processed_movie_files.add(filepath)
+        filepath, is_new, url_changed = write_strm_file(movie_dir, folder_name, url, content_id)
+        add_processed(filepath)
         total_items_processed += 1
         movies_processed += 1
         
         if is_new:
             movies_added += 1
             # Track directory for batch refresh (only if new)
-            new_movie_directories.add(filepath.parent)
+            add_new_dir(filepath.parent)
         elif url_changed:
             movies_updated += 1
-            # For updated files, refresh the specific item immediately
-            notify_emby_updated(filepath)
+            # Track updated files for a single batched notification after the loop
+            add_updated(filepath)
     
     movies_skipped = len(movies) - movies_processed - movies_skipped_unchanged
     if movies_added > 0 or movies_updated > 0:
@@ -709,6 +1065,8 @@ def process_playlist():
     # Batch refresh directories with new movie files
     if new_movie_directories:
         batch_refresh_directories(new_movie_directories)
+    if updated_movie_files:
+        notify_emby_updated_files(updated_movie_files, new_movie_directories)
 
     # Process series
     logger.info(f"Processing {len(series)} series episode(s)")
@@ -716,6 +1074,10 @@ def process_playlist():
     series_updated = 0
     series_processed = 0
     series_skipped_unchanged = 0
+    # Bind per-item bookkeeping methods once instead of looking them up every iteration
+    add_processed = processed_series_files.add
+    add_new_dir = new_series_directories.add
+    add_updated = updated_series_files.append
     for tvg_name, url in series:
         folder_name = parse_series_name(tvg_name)
         season, episode = extract_season_episode(tvg_name)
@@ -725,26 +1087,14 @@ def process_playlist():
         # When multiple versions exist, check all .strm files in the directory
         # to avoid processing items that already exist in any file
         episode_dir = SERIES_DIR / folder_name / season
-        base_filepath = episode_dir / f"{episode}.strm"
         
         # Check all existing .strm files in the directory to see if URL already exists
-        is_unchanged = False
-        existing_filepath = None
-        if episode_dir.exists():
-            for filepath in episode_dir.glob("*.strm"):
-                try:
-                    existing_url = filepath.read_text(encoding="utf-8").strip()
-                    if existing_url == url:
-                        is_unchanged = True
-                        existing_filepath = filepath
-                        break
-                except Exception:
-                    pass
+        existing_filepath = find_strm_with_url(episode_dir, url)
         
         # Skip unchanged items (don't count towards limit, but track for orphan cleanup)
-        if is_unchanged and existing_filepath:
+        if existing_filepath:
             series_skipped_unchanged += 1
-            processed_series_files.add(existing_filepath)
+            add_processed(existing_filepath)
             continue
         
         # Check if limit reached for items that need processing
@@ -755,19 +1105,19 @@ def process_playlist():
             break
         
         # Process the item (new or changed)
-        filepath, is_new, url_changed = write_strm_file(SERIES_DIR / folder_name / season, episode, url, content_id)
-        processed_series_files.add(filepath)
+        filepath, is_new, url_changed = write_strm_file(episode_dir, episode, url, content_id)
+        add_processed(filepath)
         total_items_processed += 1
         series_processed += 1
         
         if is_new:
             series_added += 1
             # Track directory for batch refresh (only if new)
-            new_series_directories.add(filepath.parent)
+            add_new_dir(filepath.parent)
         elif url_changed:
             series_updated += 1
-            # For updated files, refresh the specific item immediately
-            notify_emby_updated(filepath)
+            # Track updated files for a single batched notification after the loop
+            add_updated(filepath)
     
     series_skipped = len(series) - series_processed - series_skipped_unchanged
     if series_added > 0 or series_updated > 0:
@@ -778,21 +1128,15 @@ def process_playlist():
     # Batch refresh directories with new series files
     if new_series_directories:
         batch_refresh_directories(new_series_directories)
+    if updated_series_files:
+        notify_emby_updated_files(updated_series_files, new_series_directories)
     
     if items_limit_reached:
         logger.info(f"ℹ️ Processed {total_items_processed} items (limit: {MAX_ITEMS_PER_RUN}). Remaining items will be processed on next run.")
 
-    # Process live TV
-    if live_tv:
-        logger.info(f"Processing {len(live_tv)} live TV channel(s)")
-        LIVETV_DIR.mkdir(parents=True, exist_ok=True)
-        live_file = LIVETV_DIR / "livetv.m3u"
-        live_file.write_text("\n".join(live_tv), encoding="utf-8")
-        logger.debug(f"Live TV playlist saved to {live_file}")
-
     # Cleanup orphaned files (files that exist but weren't in current playlist)
-    cleanup_orphaned_files(processed_movie_files, MOVIES_DIR, "movie")
-    cleanup_orphaned_files(processed_series_files, SERIES_DIR, "series")
+    cleanup_orphaned_files(processed_movie_files, MOVIES_DIR, "movie", known_movie_files, movie_index_runs)
+    cleanup_orphaned_files(processed_series_files, SERIES_DIR, "series", known_series_files, series_index_runs)
 
     # Cleanup empty directories
     if REMOVE_FILES:
@@ -800,20 +1144,36 @@ def process_playlist():
         cleanup_empty_dirs(SERIES_DIR)
 
     logger.info("✅ Processing complete.")
+    return not items_limit_reached
+
+def _request_stop(signum, frame):
+    logger.info(f"Received signal {signum}, shutting down...")
+    _STOP.set()
 
 def main():
     logger.info("Starting M3U to STRM converter")
-    while True:
+    # Stop promptly on docker stop / Ctrl+C instead of sleeping out the interval
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+    # Whether the previous run processed every item (nothing left for a later run);
+    # an unchanged playlist (cached or 304) is only processed again while this is False
+    last_run_complete = False
+    while not _STOP.is_set():
         try:
-            download_playlist()
-            process_playlist()
+            playlist_changed = download_playlist()
+            if playlist_changed or not last_run_complete:
+                last_run_complete = process_playlist()
+            else:
+                logger.info("ℹ️ Playlist unchanged and fully processed, skipping processing")
         except Exception as e:
             logger.error(f"❌ Error: {e}", exc_info=True)
+            last_run_complete = False
         if INTERVAL_SECONDS <= 0:
             break
         if INTERVAL_SECONDS > 0:
             logger.info(f"Waiting {INTERVAL_SECONDS} seconds until next update...")
-        time.sleep(INTERVAL_SECONDS)
+        if _STOP.wait(INTERVAL_SECONDS):
+            break
 
 if __name__ == "__main__":
     main()